@@ -4,21 +4,28 @@ Ollama Benchmark Script
 Benchmarks nemotron_f model with different num_ctx and num_batch combinations
 """
 
-import subprocess
-import re
 import json
 import time
+import threading
 import argparse
 import yaml
 from pathlib import Path
 from datetime import datetime
 
+from runners import RUNNERS, CliRunner, HttpRunner, DEFAULT_OLLAMA_HOST
+from scheduler import SCHEDULES, schedule_cells, learn_transition_costs, predict_wall_time
+import search
+from frontier import OomFrontier, SKIPPED_OOM
+from pool import parse_endpoints, run_worker_pool
+import results_store
+
 # Configuration
 MODEL_NAME = "nemotron_f"
 MODELFILE_TEMPLATE_PATH = "/home/spikezz/Project/modelfile_nemotron_fast"
 MODELFILE_TEMP_PATH = "/home/spikezz/Project/ollama_benchmark/modelfile_temp"
 PROMPT_FILE_PATH = "/home/spikezz/Project/new_repo/p"
-RESULTS_FILE = "/home/spikezz/Project/ollama_benchmark/benchmark_results.json"
+RESULTS_LOG = "/home/spikezz/Project/ollama_benchmark/benchmark_results.jsonl"
+RESULTS_FILE = "/home/spikezz/Project/ollama_benchmark/benchmark_results.json"  # Compacted snapshot
 
 # Default test parameters (can be overridden by command line arguments)
 DEFAULT_CTX_START = 8192
@@ -29,96 +36,213 @@ DEFAULT_BATCH_START = 32
 DEFAULT_BATCH_END = 2080
 DEFAULT_BATCH_STEP = 128
 
+DEFAULT_RUNNER = CliRunner.name
+
+SEARCH_MODES = ("exhaustive", "adaptive")
+
+# Guards results_data, the results file and the OOM frontier when several workers run
+RESULTS_LOCK = threading.Lock()
+
 def read_template():
     """Read the modelfile template"""
     with open(MODELFILE_TEMPLATE_PATH, 'r') as f:
         return f.read()
 
-def create_modelfile(template, num_ctx, num_batch, num_predict=2):
-    """Create a modelfile with specified parameters"""
-    # Replace num_ctx and num_batch in template
-    content = re.sub(
-        r'PARAMETER num_ctx \d+',
-        f'PARAMETER num_ctx {num_ctx}',
-        template
-    )
-    content = re.sub(
-        r'PARAMETER num_batch \d+',
-        f'PARAMETER num_batch {num_batch}',
-        content
-    )
-
-    # Add or replace num_predict parameter to minimize generation
-    if 'PARAMETER num_predict' in content:
-        content = re.sub(
-            r'PARAMETER num_predict \d+',
-            f'PARAMETER num_predict {num_predict}',
-            content
-        )
-    else:
-        # Add num_predict after num_batch
-        content = re.sub(
-            r'(PARAMETER num_batch \d+)',
-            f'\\1\nPARAMETER num_predict {num_predict}',
-            content
-        )
-
-    with open(MODELFILE_TEMP_PATH, 'w') as f:
-        f.write(content)
-
-    return MODELFILE_TEMP_PATH
-
-def create_ollama_model(modelfile_path):
-    """Create ollama model from modelfile"""
-    cmd = f"ollama create {MODEL_NAME} -f {modelfile_path}"
-    result = subprocess.run(
-        cmd,
-        shell=True,
-        capture_output=True,
-        text=True,
-        timeout=120
-    )
-    return result.returncode == 0
-
-def run_benchmark(prompt_file):
-    """Run ollama model and capture verbose output"""
-    cmd = f"cat {prompt_file} | ollama run {MODEL_NAME} --verbose 2>&1"
-
-    try:
-        result = subprocess.run(
-            cmd,
-            shell=True,
-            capture_output=True,
-            text=True,
-            timeout=360  # Allow up to 6 minutes per test (includes model reload time)
-        )
-        output = result.stdout + result.stderr
-        return output
-    except subprocess.TimeoutExpired:
-        return None
-
-def parse_prompt_eval_rate(output):
-    """Parse prompt eval rate from ollama verbose output"""
-    if not output:
-        return None
-
-    # Look for "prompt eval rate: X tokens/s"
-    match = re.search(r'prompt eval rate:\s+([\d.]+)\s+tokens/s', output)
-    if match:
-        return float(match.group(1))
-    return None
-
 def load_existing_results():
     """Load existing results if they exist"""
+    if Path(RESULTS_LOG).exists():
+        return results_store.load_log(RESULTS_LOG)
     if Path(RESULTS_FILE).exists():
-        with open(RESULTS_FILE, 'r') as f:
-            return json.load(f)
+        # One-time migration of results written by older versions
+        count = results_store.migrate(RESULTS_FILE, RESULTS_LOG)
+        print(f"Migrated {count} results from {RESULTS_FILE} to {RESULTS_LOG}")
+        return results_store.load_log(RESULTS_LOG)
     return {"metadata": {}, "results": []}
 
+def save_record(record):
+    """Append one result to the results log"""
+    results_store.append_result(RESULTS_LOG, record)
+
+def save_metadata(metadata):
+    """Append the current run metadata to the results log"""
+    results_store.append_metadata(RESULTS_LOG, metadata)
+
 def save_results(results):
-    """Save results to JSON file"""
-    with open(RESULTS_FILE, 'w') as f:
-        json.dump(results, f, indent=2)
+    """Compact the results log and write the JSON snapshot"""
+    results_store.compact_log(RESULTS_LOG, results)
+    results_store.write_snapshot(RESULTS_FILE, results)
+
+def create_runners(name, ollama_host, endpoints):
+    """Create one runner per endpoint (a single runner if none are configured)"""
+    if not endpoints:
+        return [create_runner(name, ollama_host)]
+    if name != HttpRunner.name:
+        print(f"Note: endpoints configured, using the http runner")
+    return [HttpRunner(MODEL_NAME, PROMPT_FILE_PATH, host=endpoint) for endpoint in endpoints]
+
+def create_runner(name, ollama_host):
+    """Create the benchmark runner selected by name"""
+    if name not in RUNNERS:
+        raise ValueError(f"Unknown runner '{name}' (choose from: {', '.join(RUNNERS)})")
+    if name == HttpRunner.name:
+        return HttpRunner(MODEL_NAME, PROMPT_FILE_PATH, host=ollama_host)
+    return CliRunner(MODEL_NAME, read_template(), PROMPT_FILE_PATH, MODELFILE_TEMP_PATH)
+
+def run_test(runner, results_data, num_ctx, num_batch, frontier=None):
+    """Run one test cell, append its record and save the results"""
+    test_start = time.time()
+    outcome = runner.run_cell(num_ctx, num_batch)
+    record = {"num_ctx": num_ctx, "num_batch": num_batch}
+    record.update(outcome)
+    record["duration_seconds"] = round(time.time() - test_start, 2)
+    if runner.host:
+        record["host"] = runner.host
+
+    if record.get("prompt_eval_rate") is not None:
+        print(f"  ✓ prompt eval rate: {record['prompt_eval_rate']:.2f} tokens/s (num_ctx={num_ctx}, num_batch={num_batch})")
+        record["timestamp"] = datetime.now().isoformat()
+
+    with RESULTS_LOCK:
+        results_data["results"].append(record)
+        if frontier is not None:
+            frontier.observe(record)
+
+        # Save results after each test
+        save_record(record)
+    return record
+
+def discard_results(results_data, cell):
+    """Remove every recorded result for a cell"""
+    results_data["results"] = [r for r in results_data["results"]
+                               if (r["num_ctx"], r["num_batch"]) != cell]
+
+def skip_predicted_oom(runner, results_data, frontier, cell, verify_frontier):
+    """Record a cell as skipped if the OOM frontier predicts it cannot fit"""
+    if frontier is None:
+        return False
+    with RESULTS_LOCK:
+        blocker = frontier.blocking_failure(cell)
+        if blocker is None:
+            return False
+        reprobe = verify_frontier and blocker not in frontier.verified
+        if reprobe:
+            frontier.verified.add(blocker)
+            discard_results(results_data, blocker)
+
+    if reprobe:
+        # Re-probe the boundary failure once; allocation errors are often transient
+        print(f"  Re-probing frontier boundary num_ctx={blocker[0]}, num_batch={blocker[1]}...")
+        run_test(runner, results_data, *blocker, frontier=frontier)
+        with RESULTS_LOCK:
+            moved = not frontier.predicts_oom(cell)
+        if moved:
+            print("  Frontier moved, testing this cell")
+            return False
+
+    print(f"  Skipped: num_ctx={cell[0]}, num_batch={cell[1]} predicted OOM "
+          f"(num_ctx={blocker[0]}, num_batch={blocker[1]} failed)")
+    record = {
+        "num_ctx": cell[0],
+        "num_batch": cell[1],
+        "prompt_eval_rate": None,
+        "error": SKIPPED_OOM
+    }
+    with RESULTS_LOCK:
+        results_data["results"].append(record)
+        save_record(record)
+    return True
+
+def run_adaptive_search(runner, results_data, ctx_values, batch_values, options,
+                        frontier=None, verify_frontier=False):
+    """Test cells picked by the adaptive search until the optimum is stable"""
+    adaptive = search.AdaptiveSearch(ctx_values, batch_values, **options)
+    for r in results_data["results"]:
+        adaptive.observe(r["num_ctx"], r["num_batch"], r.get("prompt_eval_rate"), counted=False)
+
+    print(f"Adaptive search: coarse stride {adaptive.coarse_stride}, tolerance {adaptive.tolerance:.1%}, "
+          f"patience {adaptive.patience}, at most {adaptive.max_runs} runs")
+    while True:
+        cell = adaptive.next_cell()
+        if cell is None:
+            break
+        num_ctx, num_batch = cell
+        print(f"\n[adaptive {adaptive.runs + 1}/{adaptive.max_runs}] Testing num_ctx={num_ctx}, num_batch={num_batch} "
+              f"(stride {adaptive.stride})")
+        if skip_predicted_oom(runner, results_data, frontier, cell, verify_frontier):
+            adaptive.observe(num_ctx, num_batch, None, counted=False)
+            continue
+        record = run_test(runner, results_data, num_ctx, num_batch, frontier)
+        adaptive.observe(num_ctx, num_batch, record.get("prompt_eval_rate"))
+
+    print(f"\nAdaptive search stopped after {adaptive.runs} runs: {adaptive.stop_reason}")
+    if adaptive.best_cell is not None:
+        print(f"Best so far: num_ctx={adaptive.best_cell[0]}, num_batch={adaptive.best_cell[1]}, "
+              f"rate={adaptive.best_rate:.2f} tokens/s")
+
+def run_exhaustive_sweep(runners, results_data, ctx_values, batch_values, schedule,
+                         frontier=None, verify_frontier=False):
+    """Test every pending cell of the grid in scheduled order"""
+    # Track completed tests
+    completed = set()
+    for r in results_data["results"]:
+        completed.add((r["num_ctx"], r["num_batch"]))
+
+    # Order the pending tests
+    grid = [(num_ctx, num_batch) for num_ctx in ctx_values for num_batch in batch_values]
+    pending = [cell for cell in grid if cell not in completed]
+    total_tests = len(grid)
+    skipped = total_tests - len(pending)
+    last_cell = None
+    if results_data["results"]:
+        last_cell = (results_data["results"][-1]["num_ctx"], results_data["results"][-1]["num_batch"])
+
+    costs = learn_transition_costs(results_data["results"])
+    order = schedule_cells(pending, schedule, costs, start=last_cell)
+    predicted_seconds = predict_wall_time(order, costs, start=last_cell) / len(runners)
+
+    if skipped:
+        print(f"Skipping {skipped} tests (already completed)")
+    print(f"Learned cost per test: " + ", ".join(f"{kind}={seconds:.0f}s" for kind, seconds in sorted(costs.items())))
+    print(f"Predicted time for {len(order)} pending tests: ~{predicted_seconds / 3600:.1f} hours "
+          f"(naive estimate: ~{len(order) * 2.1 / 60 / len(runners):.1f} hours)")
+
+    start_time = time.time()
+    progress = {"started": skipped, "finished": 0}
+
+    def test_cell(runner, cell):
+        num_ctx, num_batch = cell
+        with RESULTS_LOCK:
+            progress["started"] += 1
+            test_num = progress["started"]
+            finished = progress["finished"]
+
+        elapsed = time.time() - start_time
+        avg_time_per_test = elapsed / max(1, finished)
+        remaining_tests = total_tests - test_num
+        eta_seconds = avg_time_per_test * remaining_tests
+        eta_hours = eta_seconds / 3600
+
+        where = f" on {runner.host}" if len(runners) > 1 else ""
+        print(f"\n[{test_num}/{total_tests}] Testing num_ctx={num_ctx}, num_batch={num_batch}{where}")
+        print(f"  ETA: {eta_hours:.2f} hours ({eta_seconds/60:.1f} minutes)")
+
+        # Skip cells beyond the learned OOM frontier, otherwise run the test
+        if not skip_predicted_oom(runner, results_data, frontier, cell, verify_frontier):
+            run_test(runner, results_data, num_ctx, num_batch, frontier)
+
+        with RESULTS_LOCK:
+            progress["finished"] += 1
+
+    if len(runners) == 1:
+        for cell in order:
+            test_cell(runners[0], cell)
+        return
+
+    # Several endpoints: workers pull cells from a shared queue
+    counts = run_worker_pool(runners, order, test_cell)
+    print()
+    for runner, count in zip(runners, counts):
+        print(f"{runner.host}: {count} tests")
 
 def load_config_from_yaml(yaml_file):
     """Load configuration from YAML file"""
@@ -148,6 +272,9 @@ Examples:
 
   # Run with specific config file
   python3 benchmark_ollama.py --config configs/middle_range.yaml
+
+  # Drive the Ollama HTTP API instead of recreating the model per test
+  python3 benchmark_ollama.py --runner http --ollama-host http://localhost:11434
         """)
 
     parser.add_argument('--config', type=str, default='benchmark_config.yaml',
@@ -168,6 +295,24 @@ Examples:
     parser.add_argument('--batch-step', type=int, default=None,
                         help='num_batch step size (overrides config file)')
 
+    parser.add_argument('--schedule', choices=SCHEDULES, default=None,
+                        help='Test order: column, row, or auto (minimize reloads; overrides config file)')
+
+    parser.add_argument('--search', choices=SEARCH_MODES, default=None,
+                        help='Sweep every cell (exhaustive) or let the surrogate pick cells (adaptive)')
+
+    parser.add_argument('--no-oom-pruning', action='store_true',
+                        help='Run every cell even if a smaller configuration already ran out of memory')
+    parser.add_argument('--verify-frontier', action='store_true',
+                        help='Re-probe each OOM boundary cell once before pruning the cells beyond it')
+
+    parser.add_argument('--runner', choices=sorted(RUNNERS), default=None,
+                        help=f'Benchmark backend (overrides config file, default: {DEFAULT_RUNNER})')
+    parser.add_argument('--ollama-host', type=str, default=None,
+                        help=f'Ollama server URL for the http runner (default: {DEFAULT_OLLAMA_HOST})')
+    parser.add_argument('--endpoints', type=str, default=None,
+                        help='Comma-separated Ollama server URLs to run tests on in parallel (overrides config file)')
+
     return parser.parse_args()
 
 def main():
@@ -189,6 +334,26 @@ def main():
 
     # Get test order preference (default: column-first)
     test_row_first = config.get('test_row_first', False)
+    schedule = config.get('schedule', "row" if test_row_first else "column")
+
+    # Get search mode (default: test every cell)
+    search_mode = config.get('search', "exhaustive")
+    adaptive_config = config.get('adaptive', {})
+    adaptive_options = {
+        "coarse_stride": adaptive_config.get('coarse_stride', search.DEFAULT_COARSE_STRIDE),
+        "tolerance": adaptive_config.get('tolerance', search.DEFAULT_TOLERANCE),
+        "patience": adaptive_config.get('patience', search.DEFAULT_PATIENCE),
+        "max_runs": adaptive_config.get('max_runs', search.DEFAULT_MAX_RUNS),
+    }
+
+    # Get OOM pruning preference (default: prune cells beyond a failed configuration)
+    oom_pruning = config.get('oom_pruning', True)
+    verify_frontier = config.get('verify_frontier', False)
+
+    # Get backend (default: recreate model and run through the CLI)
+    runner_name = config.get('runner', DEFAULT_RUNNER)
+    ollama_host = config.get('ollama_host', DEFAULT_OLLAMA_HOST)
+    endpoints = parse_endpoints(config.get('endpoints'))
 
     # Command line arguments override config file
     if args.ctx_start is not None:
@@ -203,6 +368,20 @@ def main():
         batch_end = args.batch_end
     if args.batch_step is not None:
         batch_step = args.batch_step
+    if args.schedule is not None:
+        schedule = args.schedule
+    if args.search is not None:
+        search_mode = args.search
+    if args.no_oom_pruning:
+        oom_pruning = False
+    if args.verify_frontier:
+        verify_frontier = True
+    if args.runner is not None:
+        runner_name = args.runner
+    if args.ollama_host is not None:
+        ollama_host = args.ollama_host
+    if args.endpoints is not None:
+        endpoints = parse_endpoints(args.endpoints)
 
     # Create ranges based on final values
     NUM_CTX_RANGE = range(ctx_start, ctx_end + 1, ctx_step)
@@ -220,10 +399,16 @@ def main():
 
     print(f"Total tests: {total_tests}")
     print(f"num_predict: 2 (minimal generation to test prompt eval only)")
-    if test_row_first:
+    if schedule == "row":
         print(f"Test order: Row-first (complete horizontal rows - fixed batch, varying ctx)")
-    else:
+    elif schedule == "column":
         print(f"Test order: Column-first (complete vertical columns - fixed ctx, varying batch)")
+    else:
+        print(f"Test order: Auto (grouped to minimize memory reallocations)")
+    if endpoints:
+        print(f"Runner: http on {len(endpoints)} endpoint(s) ({', '.join(endpoints)})")
+    else:
+        print(f"Runner: {runner_name}" + (f" ({ollama_host})" if runner_name == HttpRunner.name else ""))
     print(f"Estimated time per test: ~2.1 minutes (model reload + inference)")
     print(f"Estimated total time: ~{total_tests * 2.1 / 60:.1f} hours (~{total_tests * 2.1 / 1440:.1f} days)")
     print("=" * 80)
@@ -235,128 +420,33 @@ def main():
         "start_time": datetime.now().isoformat(),
         "num_ctx_range": f"{NUM_CTX_RANGE.start}-{NUM_CTX_RANGE.stop-1}:{NUM_CTX_RANGE.step}",
         "num_batch_range": f"{NUM_BATCH_RANGE.start}-{NUM_BATCH_RANGE.stop-1}:{NUM_BATCH_RANGE.step}",
-        "total_tests": total_tests
+        "total_tests": total_tests,
+        "runner": runner_name,
+        "endpoints": endpoints
     }
+    save_metadata(results_data["metadata"])
 
-    # Read template
-    template = read_template()
+    # Pruned cells are re-evaluated against the current frontier on every start
+    results_data["results"] = [r for r in results_data.get("results", []) if r.get("error") != SKIPPED_OOM]
+    frontier = OomFrontier(results_data["results"]) if oom_pruning else None
+    if frontier is not None and frontier.failures:
+        print(f"OOM frontier: {len(frontier.boundary())} boundary cells from {len(frontier.failures)} recorded failures")
 
-    # Track completed tests
-    completed = set()
-    for r in results_data.get("results", []):
-        completed.add((r["num_ctx"], r["num_batch"]))
+    # Create the backends that run the tests (one per endpoint)
+    runners = create_runners(runner_name, ollama_host, endpoints)
 
     # Run benchmark for each combination
-    test_num = 0
     start_time = time.time()
 
-    # Choose loop order based on test_row_first flag
-    if test_row_first:
-        # Row-first: iterate batch (rows) in outer loop, ctx (columns) in inner loop
-        outer_range = NUM_BATCH_RANGE
-        inner_range = NUM_CTX_RANGE
-        outer_is_batch = True
+    if search_mode == "adaptive":
+        # The search picks one cell at a time from everything measured so far
+        if len(runners) > 1:
+            print(f"Note: adaptive search is sequential, using {runners[0].host} only")
+        run_adaptive_search(runners[0], results_data, NUM_CTX_RANGE, NUM_BATCH_RANGE, adaptive_options,
+                            frontier, verify_frontier)
     else:
-        # Column-first: iterate ctx (columns) in outer loop, batch (rows) in inner loop
-        outer_range = NUM_CTX_RANGE
-        inner_range = NUM_BATCH_RANGE
-        outer_is_batch = False
-
-    for outer_val in outer_range:
-        for inner_val in inner_range:
-            # Assign to appropriate variables based on loop order
-            if outer_is_batch:
-                num_batch = outer_val
-                num_ctx = inner_val
-            else:
-                num_ctx = outer_val
-                num_batch = inner_val
-            test_num += 1
-
-            # Skip if already completed
-            if (num_ctx, num_batch) in completed:
-                print(f"[{test_num}/{total_tests}] Skipping num_ctx={num_ctx}, num_batch={num_batch} (already completed)")
-                continue
-
-            elapsed = time.time() - start_time
-            avg_time_per_test = elapsed / max(1, test_num - len(completed) - 1)
-            remaining_tests = total_tests - test_num
-            eta_seconds = avg_time_per_test * remaining_tests
-            eta_hours = eta_seconds / 3600
-
-            print(f"\n[{test_num}/{total_tests}] Testing num_ctx={num_ctx}, num_batch={num_batch}")
-            print(f"  ETA: {eta_hours:.2f} hours ({eta_seconds/60:.1f} minutes)")
-
-            # Create modelfile
-            print("  Creating modelfile...")
-            modelfile_path = create_modelfile(template, num_ctx, num_batch)
-
-            # Create model
-            print("  Creating ollama model...")
-            if not create_ollama_model(modelfile_path):
-                print("  ERROR: Failed to create model")
-                results_data["results"].append({
-                    "num_ctx": num_ctx,
-                    "num_batch": num_batch,
-                    "prompt_eval_rate": None,
-                    "error": "Failed to create model"
-                })
-                save_results(results_data)
-                continue
-
-            # Run benchmark
-            print("  Running benchmark...")
-            output = run_benchmark(PROMPT_FILE_PATH)
-
-            if output is None:
-                print("  ERROR: Benchmark timed out")
-                results_data["results"].append({
-                    "num_ctx": num_ctx,
-                    "num_batch": num_batch,
-                    "prompt_eval_rate": None,
-                    "error": "Timeout"
-                })
-                save_results(results_data)
-                continue
-
-            # Parse result
-            rate = parse_prompt_eval_rate(output)
-
-            if rate is not None:
-                print(f"  ✓ prompt eval rate: {rate:.2f} tokens/s")
-                results_data["results"].append({
-                    "num_ctx": num_ctx,
-                    "num_batch": num_batch,
-                    "prompt_eval_rate": rate,
-                    "timestamp": datetime.now().isoformat()
-                })
-            else:
-                print("  ERROR: Could not parse prompt eval rate")
-                if output:
-                    # Print last 500 chars of output to diagnose the issue
-                    print(f"  Output (last 500 chars): {output[-500:]}")
-                    # Check for common error patterns
-                    if "out of memory" in output.lower() or "oom" in output.lower():
-                        error_type = "CUDA OOM"
-                    elif "cuda error" in output.lower() or "resource allocation failed" in output.lower():
-                        error_type = "CUDA resource allocation error"
-                    elif "error" in output.lower():
-                        error_type = "Ollama error"
-                    else:
-                        error_type = "Parse error"
-                else:
-                    error_type = "Timeout or no output"
-                    print(f"  No output received (likely timeout)")
-
-                results_data["results"].append({
-                    "num_ctx": num_ctx,
-                    "num_batch": num_batch,
-                    "prompt_eval_rate": None,
-                    "error": error_type
-                })
-
-            # Save results after each test
-            save_results(results_data)
+        run_exhaustive_sweep(runners, results_data, NUM_CTX_RANGE, NUM_BATCH_RANGE, schedule,
+                             frontier, verify_frontier)
 
     # Final summary
     results_data["metadata"]["end_time"] = datetime.now().isoformat()
@@ -365,7 +455,7 @@ def main():
 
     print("\n" + "=" * 80)
     print("Benchmark Complete!")
-    print(f"Results saved to: {RESULTS_FILE}")
+    print(f"Results saved to: {RESULTS_LOG} (snapshot: {RESULTS_FILE})")
     print(f"Total time: {(time.time() - start_time)/3600:.2f} hours")
     print("=" * 80)
 
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+OOM feasibility frontier
+Learns which (num_ctx, num_batch) cells cannot fit in GPU memory from
+recorded failures, assuming memory use grows with both parameters
+"""
+
+# Errors that mean the configuration did not fit in GPU memory
+OOM_ERRORS = ("CUDA OOM", "CUDA resource allocation error")
+
+# Error recorded for cells that were pruned instead of executed
+SKIPPED_OOM = "skipped: predicted OOM"
+
+def dominates(cell, other):
+    """True if cell needs at least as much memory as other on both axes"""
+    return cell[0] >= other[0] and cell[1] >= other[1]
+
+class OomFrontier:
+    """Monotone frontier: if (ctx, batch) OOMs, every (ctx' >= ctx, batch' >= batch) is infeasible"""
+
+    def __init__(self, results=()):
+        self.failures = set()  # Cells that failed with an OOM-type error
+        self.verified = set()  # Failures that have been re-probed once
+        for r in results:
+            self.observe(r)
+
+    def observe(self, record):
+        """Update the frontier from a result record"""
+        cell = (record["num_ctx"], record["num_batch"])
+        if record.get("prompt_eval_rate") is not None:
+            # A success inside the predicted OOM region means those failures were transient
+            self.failures = {f for f in self.failures if not dominates(cell, f)}
+        elif record.get("error") in OOM_ERRORS:
+            self.failures.add(cell)
+
+    def blocking_failure(self, cell):
+        """Return the recorded failure that predicts this cell to OOM, or None"""
+        blockers = [f for f in self.failures if dominates(cell, f)]
+        if not blockers:
+            return None
+        # Prefer the smallest failure: it prunes the most cells, so it is worth re-verifying
+        return min(blockers)
+
+    def predicts_oom(self, cell):
+        """True if the cell lies on or beyond the learned frontier"""
+        return self.blocking_failure(cell) is not None
+
+    def boundary(self):
+        """Minimal failing cells that define the frontier"""
+        return sorted(f for f in self.failures
+                      if not any(g != f and dominates(f, g) for g in self.failures))
@@ -3,21 +3,24 @@
 Generate heatmap from benchmark results
 """
 
-import json
 import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
 from pathlib import Path
 
+import results_store
+
 # Configuration
+RESULTS_LOG = "/home/spikezz/Project/ollama_benchmark/benchmark_results.jsonl"
 RESULTS_FILE = "/home/spikezz/Project/ollama_benchmark/benchmark_results.json"
 OUTPUT_FILE = "/home/spikezz/Project/ollama_benchmark/heatmap_highlighted.png"
 OUTPUT_CSV = "/home/spikezz/Project/ollama_benchmark/results_table.csv"
 
 def load_results():
-    """Load benchmark results"""
-    with open(RESULTS_FILE, 'r') as f:
-        return json.load(f)
+    """Load benchmark results (the JSONL log if present, else the JSON snapshot)"""
+    if Path(RESULTS_LOG).exists():
+        return results_store.load_results(RESULTS_LOG)
+    return results_store.load_results(RESULTS_FILE)
 
 def create_heatmap_data(results):
     """Convert results to heatmap format"""
@@ -98,6 +101,7 @@ def plot_heatmap(data, num_ctx_values, num_batch_values, metadata, errors):
         error_short = error_type.replace("CUDA resource allocation error", "CUDA alloc\nerror")
         error_short = error_short.replace("Parse error", "Parse\nerror")
         error_short = error_short.replace("Timeout or no output", "Timeout")
+        error_short = error_short.replace("skipped: predicted OOM", "Predicted\nOOM")
 
         ax.text(ctx_idx + 0.5, batch_idx + 0.5, f'✗\n{error_short}',
                 ha='center', va='center', color='red', fontsize=8, fontweight='bold')
@@ -140,7 +144,7 @@ def plot_heatmap(data, num_ctx_values, num_batch_values, metadata, errors):
 
     return max_rate, best_ctx if len(max_pos[0]) > 0 else None, best_batch if len(max_pos[0]) > 0 else None
 
-def print_statistics(data, num_ctx_values, num_batch_values):
+def print_statistics(data, num_ctx_values, num_batch_values, errors):
     """Print summary statistics"""
     # Count successful tests (not NaN and not -1)
     successful_data = data[(~np.isnan(data)) & (data != -1)]
@@ -157,6 +161,9 @@ def print_statistics(data, num_ctx_values, num_batch_values):
     print(f"Total possible combinations: {total_possible}")
     print(f"Successful tests: {len(successful_data)}")
     print(f"Failed tests: {failed_count}")
+    skipped_count = sum(1 for error in errors.values() if error == "skipped: predicted OOM")
+    if skipped_count:
+        print(f"  of which skipped (predicted OOM): {skipped_count}")
     print(f"Not yet tested: {untested_count}")
     print(f"Coverage: {len(num_ctx_values)} num_ctx values × {len(num_batch_values)} num_batch values")
     print()
@@ -204,7 +211,7 @@ def main():
     max_rate, best_ctx, best_batch = plot_heatmap(data, num_ctx_values, num_batch_values, results_data.get("metadata", {}), errors)
 
     # Print statistics
-    print_statistics(data, num_ctx_values, num_batch_values)
+    print_statistics(data, num_ctx_values, num_batch_values, errors)
     print()
 
     if best_ctx is not None:
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Worker pool
+Runs test cells in parallel against several identical Ollama endpoints,
+one worker thread per endpoint pulling from a shared queue
+"""
+
+import threading
+from queue import Queue, Empty
+
+def parse_endpoints(value):
+    """Parse endpoints from a YAML list or a comma-separated string"""
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = value.split(',')
+    return [v.strip().rstrip('/') for v in value if v and v.strip()]
+
+def run_worker_pool(runners, cells, run_cell):
+    """Call run_cell(runner, cell) for every cell, with one worker per runner
+
+    Cells are handed out in order from a shared queue, so a fast endpoint
+    simply picks up more of them. Returns the number of cells each runner ran.
+    """
+    queue = Queue()
+    for cell in cells:
+        queue.put(cell)
+
+    counts = {id(runner): 0 for runner in runners}
+    errors = []
+
+    def worker(runner):
+        while True:
+            try:
+                cell = queue.get_nowait()
+            except Empty:
+                return
+            try:
+                run_cell(runner, cell)
+                counts[id(runner)] += 1
+            except Exception as e:
+                # Keep the other workers going; report after the pool drains
+                errors.append((runner, cell, e))
+                print(f"  ERROR: worker for {runner.host} failed on {cell}: {e}")
+
+    threads = [threading.Thread(target=worker, args=(runner,), daemon=True) for runner in runners]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    if errors:
+        raise RuntimeError(f"{len(errors)} cells failed inside the worker pool")
+    return [counts[id(runner)] for runner in runners]
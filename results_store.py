@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Results store
+Append-only, fsync'd JSONL log with one line per test result, plus a
+compacted JSON snapshot in the original benchmark_results.json format.
+
+Each log line is either a result record or a metadata update:
+  {"num_ctx": 8192, "num_batch": 32, "prompt_eval_rate": 81.2, ...}
+  {"metadata": {"start_time": "...", ...}}
+When a cell appears more than once, the latest record wins.
+
+Usage:
+  python3 results_store.py migrate benchmark_results.json benchmark_results.jsonl
+  python3 results_store.py compact benchmark_results.jsonl benchmark_results.json
+"""
+
+import os
+import sys
+import json
+import argparse
+from pathlib import Path
+
+def record_key(record):
+    """Identity of a test cell; a later record with the same key replaces the earlier one"""
+    return (record["num_ctx"], record["num_batch"])
+
+def _fsync_write(path, text, mode='a'):
+    """Write text and make sure it reached the disk"""
+    with open(path, mode) as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+
+def _atomic_write(path, text):
+    """Replace a file atomically so readers never see a partial write"""
+    tmp_path = f"{path}.tmp"
+    _fsync_write(tmp_path, text, mode='w')
+    os.replace(tmp_path, path)
+
+def iter_log(log_path):
+    """Stream (kind, payload) entries from a JSONL log, skipping a torn last line"""
+    with open(log_path, 'r') as f:
+        for line_num, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                print(f"Warning: ignoring unreadable line {line_num} in {log_path}")
+                continue
+            if "metadata" in entry and "num_ctx" not in entry:
+                yield "metadata", entry["metadata"]
+            else:
+                yield "result", entry
+
+def load_log(log_path):
+    """Rebuild {"metadata", "results"} from a JSONL log, keeping the latest record per cell"""
+    metadata = {}
+    latest = {}
+    for kind, payload in iter_log(log_path):
+        if kind == "metadata":
+            metadata = payload
+        else:
+            key = record_key(payload)
+            # Re-insert so the record moves to its latest position in execution order
+            latest.pop(key, None)
+            latest[key] = payload
+    return {"metadata": metadata, "results": list(latest.values())}
+
+def load_results(path):
+    """Load results from a JSONL log or a JSON snapshot, depending on the extension"""
+    if str(path).endswith('.jsonl'):
+        return load_log(path)
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def append_result(log_path, record):
+    """Append one result record to the log (O(1) per test)"""
+    _fsync_write(log_path, json.dumps(record) + '\n')
+
+def append_metadata(log_path, metadata):
+    """Append a metadata update to the log"""
+    _fsync_write(log_path, json.dumps({"metadata": metadata}) + '\n')
+
+def write_snapshot(snapshot_path, results_data):
+    """Write the compacted results in the benchmark_results.json format"""
+    _atomic_write(snapshot_path, json.dumps(results_data, indent=2))
+
+def compact_log(log_path, results_data):
+    """Rewrite the log with only the latest record per cell"""
+    lines = [json.dumps({"metadata": results_data.get("metadata", {})})]
+    lines.extend(json.dumps(r) for r in results_data.get("results", []))
+    _atomic_write(log_path, '\n'.join(lines) + '\n')
+
+def migrate(json_path, log_path):
+    """Convert an existing benchmark_results.json into a JSONL log"""
+    with open(json_path, 'r') as f:
+        results_data = json.load(f)
+    compact_log(log_path, results_data)
+    return len(results_data.get("results", []))
+
+def parse_arguments():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description='Migrate or compact benchmark result logs')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    m = sub.add_parser('migrate', help='Convert a benchmark_results.json file into a JSONL log')
+    m.add_argument('json_file')
+    m.add_argument('log_file')
+    m.add_argument('--force', action='store_true', help='Overwrite an existing log')
+
+    c = sub.add_parser('compact', help='Deduplicate a JSONL log and write a JSON snapshot')
+    c.add_argument('log_file')
+    c.add_argument('snapshot_file')
+
+    return parser.parse_args()
+
+def main():
+    """Command line entry point"""
+    args = parse_arguments()
+    if args.command == 'migrate':
+        if Path(args.log_file).exists() and not args.force:
+            print(f"ERROR: {args.log_file} already exists (use --force to overwrite)")
+            sys.exit(1)
+        count = migrate(args.json_file, args.log_file)
+        print(f"Migrated {count} results from {args.json_file} to {args.log_file}")
+    else:
+        results_data = load_log(args.log_file)
+        compact_log(args.log_file, results_data)
+        write_snapshot(args.snapshot_file, results_data)
+        print(f"Compacted {len(results_data['results'])} results into {args.log_file} and {args.snapshot_file}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Benchmark runners
+Pluggable backends that execute a single (num_ctx, num_batch) test cell
+"""
+
+import subprocess
+import re
+import json
+import socket
+import urllib.request
+import urllib.error
+
+DEFAULT_OLLAMA_HOST = "http://localhost:11434"
+
+def create_modelfile(template, num_ctx, num_batch, output_path, num_predict=2):
+    """Create a modelfile with specified parameters"""
+    # Replace num_ctx and num_batch in template
+    content = re.sub(
+        r'PARAMETER num_ctx \d+',
+        f'PARAMETER num_ctx {num_ctx}',
+        template
+    )
+    content = re.sub(
+        r'PARAMETER num_batch \d+',
+        f'PARAMETER num_batch {num_batch}',
+        content
+    )
+
+    # Add or replace num_predict parameter to minimize generation
+    if 'PARAMETER num_predict' in content:
+        content = re.sub(
+            r'PARAMETER num_predict \d+',
+            f'PARAMETER num_predict {num_predict}',
+            content
+        )
+    else:
+        # Add num_predict after num_batch
+        content = re.sub(
+            r'(PARAMETER num_batch \d+)',
+            f'\\1\nPARAMETER num_predict {num_predict}',
+            content
+        )
+
+    with open(output_path, 'w') as f:
+        f.write(content)
+
+    return output_path
+
+def create_ollama_model(model_name, modelfile_path):
+    """Create ollama model from modelfile"""
+    cmd = f"ollama create {model_name} -f {modelfile_path}"
+    result = subprocess.run(
+        cmd,
+        shell=True,
+        capture_output=True,
+        text=True,
+        timeout=120
+    )
+    return result.returncode == 0
+
+def run_benchmark(model_name, prompt_file):
+    """Run ollama model and capture verbose output"""
+    cmd = f"cat {prompt_file} | ollama run {model_name} --verbose 2>&1"
+
+    try:
+        result = subprocess.run(
+            cmd,
+            shell=True,
+            capture_output=True,
+            text=True,
+            timeout=360  # Allow up to 6 minutes per test (includes model reload time)
+        )
+        output = result.stdout + result.stderr
+        return output
+    except subprocess.TimeoutExpired:
+        return None
+
+def parse_prompt_eval_rate(output):
+    """Parse prompt eval rate from ollama verbose output"""
+    if not output:
+        return None
+
+    # Look for "prompt eval rate: X tokens/s"
+    match = re.search(r'prompt eval rate:\s+([\d.]+)\s+tokens/s', output)
+    if match:
+        return float(match.group(1))
+    return None
+
+def classify_error(output):
+    """Map failed ollama output to a short error type"""
+    if not output:
+        return "Timeout or no output"
+    lowered = output.lower()
+    if "out of memory" in lowered or "oom" in lowered:
+        return "CUDA OOM"
+    if "cuda error" in lowered or "resource allocation failed" in lowered:
+        return "CUDA resource allocation error"
+    if "error" in lowered:
+        return "Ollama error"
+    return "Parse error"
+
+class Runner:
+    """Base class for benchmark backends"""
+
+    name = "base"
+    host = None  # Where the test runs; recorded with each result
+
+    def run_cell(self, num_ctx, num_batch, num_predict=2):
+        """Run one test cell and return the result fields for it"""
+        raise NotImplementedError
+
+class CliRunner(Runner):
+    """Recreate the model with `ollama create` and run it through the CLI"""
+
+    name = "cli"
+
+    def __init__(self, model_name, template, prompt_file, modelfile_path):
+        self.model_name = model_name
+        self.host = socket.gethostname()
+        self.template = template
+        self.prompt_file = prompt_file
+        self.modelfile_path = modelfile_path
+
+    def run_cell(self, num_ctx, num_batch, num_predict=2):
+        """Rewrite the modelfile, recreate the model and run the prompt"""
+        print("  Creating modelfile...")
+        modelfile_path = create_modelfile(self.template, num_ctx, num_batch,
+                                          self.modelfile_path, num_predict)
+
+        print("  Creating ollama model...")
+        if not create_ollama_model(self.model_name, modelfile_path):
+            print("  ERROR: Failed to create model")
+            return {"prompt_eval_rate": None, "error": "Failed to create model"}
+
+        print("  Running benchmark...")
+        output = run_benchmark(self.model_name, self.prompt_file)
+
+        if output is None:
+            print("  ERROR: Benchmark timed out")
+            return {"prompt_eval_rate": None, "error": "Timeout"}
+
+        rate = parse_prompt_eval_rate(output)
+        if rate is not None:
+            return {"prompt_eval_rate": rate}
+
+        print("  ERROR: Could not parse prompt eval rate")
+        if output:
+            # Print last 500 chars of output to diagnose the issue
+            print(f"  Output (last 500 chars): {output[-500:]}")
+        else:
+            print(f"  No output received (likely timeout)")
+        return {"prompt_eval_rate": None, "error": classify_error(output)}
+
+class HttpRunner(Runner):
+    """Send per-request options to the Ollama HTTP API without recreating the model"""
+
+    name = "http"
+
+    def __init__(self, model_name, prompt_file, host=DEFAULT_OLLAMA_HOST, timeout=360):
+        self.model_name = model_name
+        self.host = host.rstrip('/')
+        self.timeout = timeout
+        with open(prompt_file, 'r') as f:
+            self.prompt = f.read()
+
+    def generate(self, options):
+        """POST a non-streaming request to /api/generate and return the JSON reply"""
+        payload = {
+            "model": self.model_name,
+            "prompt": self.prompt,
+            "stream": False,
+            "options": options
+        }
+        request = urllib.request.Request(
+            f"{self.host}/api/generate",
+            data=json.dumps(payload).encode('utf-8'),
+            headers={"Content-Type": "application/json"},
+            method="POST"
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return json.loads(response.read().decode('utf-8'))
+
+    def run_cell(self, num_ctx, num_batch, num_predict=2):
+        """Run the prompt with num_ctx/num_batch passed as request options"""
+        print(f"  Sending request to {self.host}...")
+        options = {"num_ctx": num_ctx, "num_batch": num_batch, "num_predict": num_predict}
+
+        try:
+            reply = self.generate(options)
+        except urllib.error.HTTPError as e:
+            body = e.read().decode('utf-8', errors='replace')
+            print(f"  ERROR: HTTP {e.code}: {body[-500:]}")
+            return {"prompt_eval_rate": None, "error": classify_error(body)}
+        except (socket.timeout, TimeoutError):
+            print("  ERROR: Benchmark timed out")
+            return {"prompt_eval_rate": None, "error": "Timeout"}
+        except urllib.error.URLError as e:
+            if isinstance(e.reason, (socket.timeout, TimeoutError)):
+                print("  ERROR: Benchmark timed out")
+                return {"prompt_eval_rate": None, "error": "Timeout"}
+            print(f"  ERROR: Could not reach {self.host}: {e.reason}")
+            return {"prompt_eval_rate": None, "error": "Connection error"}
+
+        count = reply.get("prompt_eval_count")
+        duration_ns = reply.get("prompt_eval_duration")
+        if not count or not duration_ns:
+            print("  ERROR: Response has no prompt eval metrics")
+            error = reply.get("error")
+            return {"prompt_eval_rate": None, "error": classify_error(error) if error else "Parse error"}
+
+        return {"prompt_eval_rate": count / (duration_ns / 1e9)}
+
+RUNNERS = {
+    CliRunner.name: CliRunner,
+    HttpRunner.name: HttpRunner,
+}
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Test scheduler
+Orders pending (num_ctx, num_batch) cells so that expensive memory
+reallocations happen as rarely as possible
+"""
+
+from datetime import datetime
+from statistics import median
+
+# Fallback cost per test (seconds) when no timings have been recorded yet
+DEFAULT_TEST_SECONDS = 2.1 * 60
+
+# Transition types between two consecutive cells
+TRANSITION_NONE = "none"    # same configuration re-tested
+TRANSITION_BATCH = "batch"  # only compute buffers change
+TRANSITION_CTX = "ctx"      # KV cache has to be reallocated
+TRANSITION_BOTH = "both"    # KV cache and compute buffers change
+
+SCHEDULES = ("auto", "column", "row")
+
+def transition_type(prev_cell, cell):
+    """Classify the change between two consecutive (num_ctx, num_batch) cells"""
+    if prev_cell is None:
+        return TRANSITION_BOTH
+    ctx_changed = prev_cell[0] != cell[0]
+    batch_changed = prev_cell[1] != cell[1]
+    if ctx_changed and batch_changed:
+        return TRANSITION_BOTH
+    if ctx_changed:
+        return TRANSITION_CTX
+    if batch_changed:
+        return TRANSITION_BATCH
+    return TRANSITION_NONE
+
+def _record_durations(results):
+    """Yield (prev_cell, cell, seconds) for consecutive recorded results on the same host"""
+    last_by_host = {}
+    for r in results:
+        host = r.get("host")
+        prev = last_by_host.get(host)
+        cell = (r["num_ctx"], r["num_batch"])
+        seconds = r.get("duration_seconds")
+        if seconds is None and prev is not None and r.get("timestamp") and prev.get("timestamp"):
+            # Older results only carry completion timestamps
+            delta = datetime.fromisoformat(r["timestamp"]) - datetime.fromisoformat(prev["timestamp"])
+            seconds = delta.total_seconds()
+        if seconds is not None and seconds > 0 and prev is not None:
+            yield (prev["num_ctx"], prev["num_batch"]), cell, seconds
+        last_by_host[host] = r
+
+def learn_transition_costs(results, default=DEFAULT_TEST_SECONDS):
+    """Estimate the wall time of a test for each transition type from recorded results"""
+    samples = {}
+    for prev_cell, cell, seconds in _record_durations(results):
+        samples.setdefault(transition_type(prev_cell, cell), []).append(seconds)
+
+    costs = {}
+    for kind, values in samples.items():
+        # Drop pauses between runs (e.g. restarts) that are far above the typical test time
+        typical = median(values)
+        kept = [v for v in values if v <= 3 * typical]
+        costs[kind] = sum(kept) / len(kept)
+
+    # Changing both parameters is at least as expensive as changing either one
+    full = costs.get(TRANSITION_BOTH, max(costs.values(), default=default))
+    costs.setdefault(TRANSITION_BOTH, full)
+    costs.setdefault(TRANSITION_CTX, full)
+    costs.setdefault(TRANSITION_BATCH, full)
+    costs.setdefault(TRANSITION_NONE, min(costs.values()))
+    return costs
+
+def predict_wall_time(order, costs, start=None):
+    """Predict the total wall time (seconds) of running cells in the given order"""
+    total = 0.0
+    prev = start
+    for cell in order:
+        total += costs[transition_type(prev, cell)]
+        prev = cell
+    return total
+
+def _serpentine(cells, major):
+    """Group cells by one axis and alternate the direction of the other axis"""
+    minor = 1 - major
+    groups = {}
+    for cell in cells:
+        groups.setdefault(cell[major], []).append(cell)
+
+    order = []
+    for i, key in enumerate(sorted(groups)):
+        group = sorted(groups[key], key=lambda c: c[minor], reverse=(i % 2 == 1))
+        order.extend(group)
+    return order
+
+def schedule_cells(cells, schedule="auto", costs=None, start=None):
+    """Return the pending cells in the order they should be tested"""
+    if schedule not in SCHEDULES:
+        raise ValueError(f"Unknown schedule '{schedule}' (choose from: {', '.join(SCHEDULES)})")
+    if schedule == "column":
+        return sorted(cells)
+    if schedule == "row":
+        return sorted(cells, key=lambda c: (c[1], c[0]))
+
+    # Group by num_ctx (KV cache stays allocated inside a group) or by num_batch,
+    # whichever the learned costs predict to be cheaper
+    costs = costs or learn_transition_costs([])
+    candidates = [_serpentine(cells, 0), _serpentine(cells, 1)]
+    return min(candidates, key=lambda order: predict_wall_time(order, costs, start))
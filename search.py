@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+Adaptive parameter search
+Fits a Gaussian-process surrogate to the measured prompt eval rates and picks
+the next (num_ctx, num_batch) cell by expected improvement, refining from a
+coarse grid towards the best region until the optimum stops moving.
+
+Run directly to replay the strategy against an existing results file:
+  python3 search.py benchmark_results.jsonl
+"""
+
+import math
+import argparse
+import numpy as np
+
+import results_store
+
+DEFAULT_COARSE_STRIDE = 4
+DEFAULT_TOLERANCE = 0.01  # Relative improvement below which the optimum counts as stable
+DEFAULT_PATIENCE = 5      # Runs without relevant improvement before zooming in / stopping
+DEFAULT_MAX_RUNS = 60
+
+LENGTHSCALES = (0.05, 0.1, 0.2, 0.4)
+NOISE = 1e-2
+
+def _rbf(a, b, lengthscale):
+    """Squared-exponential kernel between two sets of points"""
+    d2 = ((a[:, None, :] - b[None, :, :]) ** 2).sum(-1)
+    return np.exp(-0.5 * d2 / lengthscale ** 2)
+
+def _log_marginal_likelihood(X, y, lengthscale):
+    """Log marginal likelihood of normalized targets under the GP prior"""
+    K = _rbf(X, X, lengthscale) + NOISE * np.eye(len(X))
+    L = np.linalg.cholesky(K)
+    alpha = np.linalg.solve(L.T, np.linalg.solve(L, y))
+    return -0.5 * y @ alpha - np.log(np.diag(L)).sum()
+
+def gp_predict(X, y, Xs):
+    """Predict mean and standard deviation at Xs from observations (X, y)"""
+    y_mean = y.mean()
+    y_std = y.std() or 1.0
+    yn = (y - y_mean) / y_std
+
+    # Pick the lengthscale that explains the observations best
+    lengthscale = max(LENGTHSCALES, key=lambda ls: _log_marginal_likelihood(X, yn, ls))
+
+    K = _rbf(X, X, lengthscale) + NOISE * np.eye(len(X))
+    L = np.linalg.cholesky(K)
+    alpha = np.linalg.solve(L.T, np.linalg.solve(L, yn))
+    Ks = _rbf(X, Xs, lengthscale)
+    mean = Ks.T @ alpha
+    v = np.linalg.solve(L, Ks)
+    var = np.clip(1.0 - (v ** 2).sum(0), 1e-12, None)
+    return mean * y_std + y_mean, np.sqrt(var) * y_std
+
+_erf = np.vectorize(math.erf)
+
+def expected_improvement(mean, std, best, xi=0.0):
+    """Expected improvement over the current best for a maximization problem"""
+    z = (mean - best - xi) / std
+    cdf = 0.5 * (1.0 + _erf(z / math.sqrt(2.0)))
+    pdf = np.exp(-0.5 * z ** 2) / math.sqrt(2.0 * math.pi)
+    return (mean - best - xi) * cdf + std * pdf
+
+class AdaptiveSearch:
+    """Pick the next cell to test by expected improvement with successive refinement"""
+
+    def __init__(self, ctx_values, batch_values, coarse_stride=DEFAULT_COARSE_STRIDE,
+                 tolerance=DEFAULT_TOLERANCE, patience=DEFAULT_PATIENCE, max_runs=DEFAULT_MAX_RUNS):
+        self.ctx_values = list(ctx_values)
+        self.batch_values = list(batch_values)
+        self.ctx_index = {v: i for i, v in enumerate(self.ctx_values)}
+        self.batch_index = {v: i for i, v in enumerate(self.batch_values)}
+        self.coarse_stride = max(1, coarse_stride)
+        self.stride = self.coarse_stride
+        self.tolerance = tolerance
+        self.patience = patience
+        self.max_runs = max_runs
+
+        self.observed = {}  # (num_ctx, num_batch) -> rate, None for failed tests
+        self.runs = 0
+        self.stale = 0      # Runs since the best rate last improved by more than tolerance
+        self.best_cell = None
+        self.best_rate = None
+        self.stop_reason = None
+
+    def observe(self, num_ctx, num_batch, rate, counted=True):
+        """Record the outcome of a cell (rate None for failed tests)"""
+        cell = (num_ctx, num_batch)
+        if cell[0] not in self.ctx_index or cell[1] not in self.batch_index:
+            return
+        self.observed[cell] = rate
+        if not counted:
+            # Results loaded from disk seed the surrogate but do not use up the run budget
+            if rate is not None and (self.best_rate is None or rate > self.best_rate):
+                self.best_cell, self.best_rate = cell, rate
+            return
+
+        self.runs += 1
+        if rate is not None and (self.best_rate is None or rate > self.best_rate * (1 + self.tolerance)):
+            self.stale = 0
+        else:
+            self.stale += 1
+        if rate is not None and (self.best_rate is None or rate > self.best_rate):
+            self.best_cell, self.best_rate = cell, rate
+
+    def _candidates(self):
+        """Untested cells on the current refinement level"""
+        ctx_idx = range(len(self.ctx_values))
+        batch_idx = range(len(self.batch_values))
+        if self.best_cell is not None and self.stride < self.coarse_stride:
+            # Zoom into a window around the best cell once refinement started
+            bc = self.ctx_index[self.best_cell[0]]
+            bb = self.batch_index[self.best_cell[1]]
+            radius = 2 * self.stride
+            ctx_idx = range(max(0, bc - radius), min(len(self.ctx_values), bc + radius + 1))
+            batch_idx = range(max(0, bb - radius), min(len(self.batch_values), bb + radius + 1))
+
+        cells = []
+        for i in ctx_idx:
+            for j in batch_idx:
+                if i % self.stride or j % self.stride:
+                    continue
+                cell = (self.ctx_values[i], self.batch_values[j])
+                if cell not in self.observed:
+                    cells.append(cell)
+        return cells
+
+    def _normalize(self, cells):
+        """Map cells to grid-index coordinates in [0, 1]"""
+        nc = max(1, len(self.ctx_values) - 1)
+        nb = max(1, len(self.batch_values) - 1)
+        return np.array([[self.ctx_index[c] / nc, self.batch_index[b] / nb] for c, b in cells], dtype=float)
+
+    def next_cell(self):
+        """Return the next cell to test, or None when the search has converged"""
+        while True:
+            if self.runs >= self.max_runs:
+                self.stop_reason = f"run budget of {self.max_runs} exhausted"
+                return None
+            candidates = self._candidates()
+            converged = self.stale >= self.patience
+            if candidates and not converged:
+                break
+            if self.stride == 1:
+                self.stop_reason = ("optimum stable within tolerance" if converged
+                                    else "no untested cells left near the optimum")
+                return None
+            # Zoom in: halve the stride around the current best
+            self.stride = max(1, self.stride // 2)
+            self.stale = 0
+
+        successes = [(cell, rate) for cell, rate in self.observed.items() if rate is not None]
+        if len(successes) < 2:
+            # Not enough data for a surrogate yet: spread the first probes out
+            return self._space_filling(candidates)
+
+        X = self._normalize([cell for cell, _ in successes])
+        y = np.array([rate for _, rate in successes], dtype=float)
+        mean, std = gp_predict(X, y, self._normalize(candidates))
+        ei = expected_improvement(mean, std, y.max())
+        return candidates[int(np.argmax(ei))]
+
+    def _space_filling(self, candidates):
+        """Pick the candidate farthest from all tested cells (center first)"""
+        points = self._normalize(candidates)
+        if not self.observed:
+            distance = -np.abs(points - 0.5).sum(1)
+        else:
+            tested = self._normalize(list(self.observed))
+            distance = np.min(((points[:, None, :] - tested[None, :, :]) ** 2).sum(-1), axis=1)
+        return candidates[int(np.argmax(distance))]
+
+def load_oracle(results_file):
+    """Load a results file as a (num_ctx, num_batch) -> rate lookup"""
+    results = results_store.load_results(results_file).get("results", [])
+    return {(r["num_ctx"], r["num_batch"]): r.get("prompt_eval_rate") for r in results}
+
+def replay(oracle, **search_options):
+    """Run the adaptive search against recorded results and score it"""
+    ctx_values = sorted(set(c for c, _ in oracle))
+    batch_values = sorted(set(b for _, b in oracle))
+    search = AdaptiveSearch(ctx_values, batch_values, **search_options)
+
+    trace = []
+    while True:
+        cell = search.next_cell()
+        if cell is None:
+            break
+        rate = oracle.get(cell)
+        search.observe(cell[0], cell[1], rate)
+        trace.append((cell, rate))
+
+    successes = sorted((rate for rate in oracle.values() if rate is not None), reverse=True)
+    true_best = successes[0] if successes else None
+    found = search.best_rate
+    rank = successes.index(found) + 1 if found is not None else None
+    return {
+        "runs": search.runs,
+        "grid_cells": len(ctx_values) * len(batch_values),
+        "stop_reason": search.stop_reason,
+        "found_cell": search.best_cell,
+        "found_rate": found,
+        "true_best_rate": true_best,
+        "gap_percent": (true_best - found) / true_best * 100 if found is not None and true_best else None,
+        "rank": rank,
+        "trace": trace,
+    }
+
+def parse_arguments():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description='Replay the adaptive search against an existing results file')
+    parser.add_argument('results_file', help='Results log (.jsonl) or snapshot (.json) to use as ground truth')
+    parser.add_argument('--coarse-stride', type=int, default=DEFAULT_COARSE_STRIDE,
+                        help=f'Grid stride of the first, coarse level (default: {DEFAULT_COARSE_STRIDE})')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help=f'Relative improvement treated as stable (default: {DEFAULT_TOLERANCE})')
+    parser.add_argument('--patience', type=int, default=DEFAULT_PATIENCE,
+                        help=f'Runs without improvement before refining/stopping (default: {DEFAULT_PATIENCE})')
+    parser.add_argument('--max-runs', type=int, default=DEFAULT_MAX_RUNS,
+                        help=f'Maximum number of runs (default: {DEFAULT_MAX_RUNS})')
+    parser.add_argument('--verbose', action='store_true', help='Print every probed cell')
+    return parser.parse_args()
+
+def main():
+    """Replay the adaptive search and print how well it did"""
+    args = parse_arguments()
+    oracle = load_oracle(args.results_file)
+    report = replay(oracle, coarse_stride=args.coarse_stride, tolerance=args.tolerance,
+                    patience=args.patience, max_runs=args.max_runs)
+
+    if args.verbose:
+        for i, (cell, rate) in enumerate(report["trace"], 1):
+            shown = f"{rate:.2f} tokens/s" if rate is not None else "failed/untested"
+            print(f"[{i}] num_ctx={cell[0]}, num_batch={cell[1]}: {shown}")
+        print()
+
+    print("=" * 80)
+    print("ADAPTIVE SEARCH REPLAY")
+    print("=" * 80)
+    print(f"Runs: {report['runs']} of {report['grid_cells']} grid cells")
+    print(f"Stopped: {report['stop_reason']}")
+    if report["found_cell"] is not None:
+        print(f"Found: num_ctx={report['found_cell'][0]}, num_batch={report['found_cell'][1]}, "
+              f"rate={report['found_rate']:.2f} tokens/s")
+        print(f"True best rate: {report['true_best_rate']:.2f} tokens/s")
+        print(f"Gap to true optimum: {report['gap_percent']:.2f}% (rank {report['rank']})")
+    else:
+        print("No successful cell found")
+    print("=" * 80)
+
+if __name__ == "__main__":
+    main()